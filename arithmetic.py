@@ -1,8 +1,9 @@
 """
 This module contains building blocks for music arithmetic expressions.
 """
-from composition import Frequency, Symbol, Vector, Tone, Rest, Piece
+from composition import Frequency, Symbol, Vector, Tone, Rest, Piece, Repeat
 from copy import deepcopy
+from fractions import Fraction
 
 
 class PitchLiteral:
@@ -19,8 +20,9 @@ class BinaryOperation:
     formatstring = 'BinaryOperation({}, {})'
     precedence = 0
 
-    def __init__(self, left, right):
-        self.operands = (left, right)
+    def __init__(self, left, right, *rest):
+        # Associative operations may have more than two operands
+        self.operands = (left, right) + rest
 
     @property
     def left(self):
@@ -42,7 +44,10 @@ class BinaryOperation:
             else:
                 operand_strings.append(str(operand))
 
-        return self.formatstring.format(*operand_strings)
+        result = self.formatstring.format(*operand_strings[:2])
+        for operand_string in operand_strings[2:]:
+            result = self.formatstring.format(result, operand_string)
+        return result
 
 
 class Multiplication(BinaryOperation):
@@ -60,6 +65,11 @@ class Duration(BinaryOperation):
     precedence = 3
 
 
+class Repetition(BinaryOperation):
+    formatstring = '{} ^ {}'
+    precedence = 3
+
+
 class Serial(BinaryOperation):
     formatstring = '{} {}'
     precedence = 2
@@ -80,10 +90,15 @@ def to_composition(arith_expr):
                 freq = float(arith_expr.token)
                 return Frequency(freq)
             except ValueError:
-                if arith_expr == '_':
-                    return Rest()
-                else:
-                    return Symbol(arith_expr.token)
+                try:
+                    # Fractions like 15/8 are not parsed, but may result from optimization
+                    freq = Fraction(arith_expr.token)
+                    return Vector.from_frequency(freq)
+                except ValueError:
+                    if arith_expr.token == '_':
+                        return Rest()
+                    else:
+                        return Symbol(arith_expr.token)
 
     elif type(arith_expr) == Duration:
         try:
@@ -95,22 +110,32 @@ def to_composition(arith_expr):
         subject = to_composition(arith_expr.left)
         return subject.stretch(duration_factor)
 
+    elif type(arith_expr) == Repetition:
+        try:
+            count = int(arith_expr.right.token)
+        except ValueError:
+            raise ValueError('Repetition count {} is not an integer.'.format(
+                arith_expr.right.token
+            ))
+        subject = to_composition(arith_expr.left)
+        return Piece({0: [Repeat(subject, count)]})
+
     elif type(arith_expr) == Serial:
-        left_part = to_composition(arith_expr.left)
-        right_part = to_composition(arith_expr.right)
-        return left_part.concat(right_part)
+        result = to_composition(arith_expr.operands[0])
+        for operand in arith_expr.operands[1:]:
+            result = result.concat(to_composition(operand))
+        return result
 
     elif type(arith_expr) == Parallel:
-        # Concatenate with empty piece to ensure left and right parts are pieces
-        left_part = to_composition(arith_expr.left).concat(Piece())
-        right_part = to_composition(arith_expr.right).concat(Piece())
-        result = left_part.concat(Piece())
-        if isinstance(right_part, Piece):
-            for offset, tones in right_part.items():
-                result[offset] = deepcopy(tones)
-            return result
-        else:
-            raise ValueError
+        # Concatenate with empty piece to ensure all parts are pieces
+        result = to_composition(arith_expr.operands[0]).concat(Piece())
+        for operand in arith_expr.operands[1:]:
+            part = to_composition(operand).concat(Piece())
+            if not isinstance(part, Piece):
+                raise ValueError
+            for offset, tones in part.items():
+                result.setdefault(offset, []).extend(deepcopy(tones))
+        return result
 
     elif type(arith_expr) == Multiplication:
         multiplier = to_composition(arith_expr.left)
@@ -1,5 +1,6 @@
 import pyparsing as pp
-from arithmetic import Parallel, Serial, Duration, Division, Multiplication, PitchLiteral
+from arithmetic import (Parallel, Serial, Repetition, Duration, Division, Multiplication,
+                        PitchLiteral)
 pp.ParserElement.enablePackrat()
 
 
@@ -30,12 +31,20 @@ mul = pp.oneOf('/ *')
 
 
 def duration_action(s, l, t):
-    tokens = [t for t in t.asList()[0] if t != '|']
+    tokens = t.asList()[0]
     result = tokens[0]
-    for token in tokens[1:]:
-        result = Duration(result, token)
+    i = 1
+    while i < len(tokens) - 1:
+        if tokens[i] == '|':
+            result = Duration(result, tokens[i + 1])
+        elif tokens[i] == '^':
+            result = Repetition(result, tokens[i + 1])
+        else:
+            raise ValueError('Bogus duration expression.')
+
+        i += 2
     return result
-duration = pp.Literal('|')
+duration = pp.oneOf('| ^')
 
 
 def serial_action(s, l, t):
@@ -69,3 +78,7 @@ maobject.ignore(comment)
 
 def parse_file(filename):
     return maobject.parseFile(filename)[0]
+
+
+def parse_string(string):
+    return maobject.parseString(string, parseAll=True)[0]
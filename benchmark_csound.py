@@ -0,0 +1,75 @@
+"""
+Benchmark of the csound score exporter against the previous implementation,
+which wrote unsorted events one at a time.
+Note that only the new exporter sorts the events, which costs most when they were
+inserted in random order.
+"""
+import argparse
+import os
+import random
+import tempfile
+import timeit
+
+parser = argparse.ArgumentParser()
+parser.add_argument('events', help='Number of events in the benchmark piece', type=int,
+                    nargs='?', default=10 ** 6)
+args = parser.parse_args()
+
+from composition import Piece, Frequency, Vector
+from export import export_csound
+
+
+def export_csound_unbuffered(piece, outputfile):
+    """The previous implementation of export_csound."""
+    with open(outputfile, 'w') as f:
+        f.write(
+            '''
+f1  0   4096    10 1 ; use GEN10 to compute a sine wave
+
+;ins strt dur  amp(p4)   freq(p5)
+'''
+        )
+
+        for offset, tone in piece.events():
+            f.write('i1  {offset}  {duration}  4000   {pitch}\n'
+                    .format(offset=offset,
+                            duration=tone.duration,
+                            pitch=tone.frequency()))
+
+        f.write('e ; indicates the end of the score')
+
+
+def random_piece(size, shuffle):
+    """Return a piece of random tones from a scale, optionally inserted in random order."""
+    scale = [Frequency(random.uniform(100, 1000)) for _ in range(12)]
+    scale += [Vector(*(random.randint(-3, 3) for _ in range(3))) for _ in range(12)]
+    offsets = list(range(size))
+    if shuffle:
+        random.shuffle(offsets)
+    piece = Piece()
+    for offset in offsets:
+        piece[offset / 4] = [random.choice(scale).stretch(random.choice([.5, 1, 2]))]
+    return piece
+
+
+def benchmark(name, export, piece, size, repeat=3):
+    seconds = min(timeit.repeat(lambda: export(piece), number=1, repeat=repeat))
+    print('{:<12} {:>12.0f} events/s'.format(name, size / seconds))
+    return seconds
+
+
+with tempfile.TemporaryDirectory() as directory:
+    outputfile = os.path.join(directory, 'benchmark.sco')
+    for shuffle in [False, True]:
+        print('Events inserted {}'.format('in random order' if shuffle else 'in order'))
+        random.seed(0)
+        piece = random_piece(args.events, shuffle)
+        previous = benchmark('previous', lambda p: export_csound_unbuffered(p, outputfile),
+                             piece, args.events)
+        buffered = benchmark('buffered', lambda p: export_csound(p, outputfile),
+                             piece, args.events)
+        benchmark('segmented', lambda p: export_csound(p, outputfile, args.events // 10),
+                  piece, args.events)
+        benchmark('gzip', lambda p: export_csound(p, outputfile, compress=True),
+                  piece, args.events)
+        print('Speedup of buffered exporter: {:.2f}x'.format(previous / buffered))
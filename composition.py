@@ -7,11 +7,17 @@ frequencies, symbols and vectors.
 from copy import deepcopy
 import math
 import fractions
+import heapq
+import threading
+from itertools import chain
+from operator import itemgetter
 from abc import abstractmethod
 from music21 import pitch
 
 Infinity = float('inf')
 
+_realize_lock = threading.Lock()
+
 
 class Music:
 
@@ -160,23 +166,28 @@ class Vector(Tone):
         If number is not integer or no factorization exists, raise ValueError.
         """
         frac = fractions.Fraction(number)
+        if frac.numerator == 0:
+            raise ValueError
         powers = [0, 0, 0]
         for number, sign in [(frac.numerator, 1), (frac.denominator, -1)]:
             for i, prime in enumerate([2, 3, 5]):
                 while number % prime == 0:
                     number //= prime
                     powers[i] += sign
-        if number != 1:
-            raise ValueError
+            if number != 1:
+                raise ValueError
 
         return Vector(*powers)
 
     def transpose(self, pitch_factor):
+        """Transpose by given pitch factor, which may already be factorized as a vector."""
+        if isinstance(pitch_factor, Vector):
+            return self.add(pitch_factor)
         try:
             transpose_vector = Vector.from_frequency(pitch_factor)
             return self.add(transpose_vector)
         except ValueError:
-            return Frequency(self.frequency() * pitch_factor)
+            return Frequency(self.frequency() * pitch_factor, self.duration)
 
     def __str__(self):
         x, y, z = self
@@ -189,7 +200,7 @@ class Vector(Tone):
 
     def frequency(self, base_frequency=1):
         """Return the pitch of self, with 1 being mapped to the given base_pitch."""
-        x, y, z = self
+        x, y, z = self.powers
         return base_frequency * 2 ** x * 3 ** y * 5 ** z
 
     def add(self, other):
@@ -215,43 +226,230 @@ class Vector(Tone):
 # TODO: make slicing use constant time
 class Piece(dict, Music):
 
-    """Mapping from offsets to lists of tones"""
+    """
+    Mapping from offsets to lists of tones.
 
-    def __getitem__(self, index, item):
-        if type(index) == slice:
-            ...
+    Stretching and transposing a piece is deferred. The result refers to the
+    untransformed source piece and stores the composed transform, which is applied
+    once, when the contents of the result are accessed for the first time.
+    The source piece should therefore not be modified afterwards.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._source = None
+        self._time_scale = 1
+        self._pitch_factor = 1
+        self._pitch_vector = Vector()
+
+    def _transform(self, time_scale, pitch_factor, pitch_vector):
+        """
+        Return a piece with the given transform composed with the pending
+        transform of self, without touching any tones.
+        A pitch_vector of None means that the pitch factor has no 2-3-5 factorization.
+        """
+        result = Piece()
+        source = self._source
+        if source is None:
+            result._source = self
+            result._time_scale = time_scale
+            result._pitch_factor = pitch_factor
+            result._pitch_vector = pitch_vector
+            return result
+
+        result._source = source
+        result._time_scale = self._time_scale * time_scale
+        result._pitch_factor = self._pitch_factor * pitch_factor
+        if self._pitch_vector is not None and pitch_vector is not None:
+            result._pitch_vector = self._pitch_vector.add(pitch_vector)
         else:
-            ...
+            result._pitch_vector = None
+        return result
 
-    def __setitem__(self, item):
-        ...
+    def _realize(self):
+        """
+        Apply the pending transform, if any.
+        Reading a deferred piece thus modifies it, so this is done under a lock, to
+        keep reading a piece from several threads safe.
+        The pending transform itself is never changed, which allows it to be read
+        without the lock as long as the source is not None.
+        """
+        if self._source is None:
+            return
+        with _realize_lock:
+            source = self._source
+            if source is None:
+                return
+            time_scale = self._time_scale
+            pitch_factor = self._pitch_factor
+            pitch_vector = self._pitch_vector
+
+            realized = {}
+            for offset, tones in dict.items(source):
+                new_tones = []
+                for tone in tones:
+                    if time_scale != 1:
+                        tone = tone.stretch(time_scale)
+                    if pitch_factor != 1:
+                        if not isinstance(tone, Vector):
+                            tone = tone.transpose(pitch_factor)
+                        elif pitch_vector is not None:
+                            tone = tone.transpose(pitch_vector)
+                        else:
+                            tone = Frequency(tone.frequency() * pitch_factor, tone.duration)
+                    new_tones.append(tone)
+                realized[offset * time_scale] = new_tones
+            dict.update(self, realized)
+            self._source = None
+
+    def __getitem__(self, offset):
+        self._realize()
+        return dict.__getitem__(self, offset)
+
+    def __setitem__(self, offset, tones):
+        self._realize()
+        dict.__setitem__(self, offset, tones)
+
+    def __contains__(self, offset):
+        self._realize()
+        return dict.__contains__(self, offset)
+
+    def __iter__(self):
+        self._realize()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._realize()
+        return dict.__len__(self)
+
+    def __delitem__(self, offset):
+        self._realize()
+        dict.__delitem__(self, offset)
+
+    def __eq__(self, other):
+        self._realize()
+        if isinstance(other, Piece):
+            other._realize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self._realize()
+        if isinstance(other, Piece):
+            other._realize()
+        return dict.__ne__(self, other)
 
-    def stretch(self, duration_factor):
+    def __repr__(self):
+        self._realize()
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocol):
+        # Pickle the realized contents only, since the pending transform is not needed
+        return Piece, (dict(self.items()),)
+
+    def __deepcopy__(self, memo):
         result = Piece()
         for offset, tones in self.items():
-            new_tones = []
-            for tone in tones:
-                new_tones.append(tone.stretch(duration_factor))
-            result[offset * duration_factor] = new_tones
+            dict.__setitem__(result, offset, deepcopy(tones, memo))
         return result
 
-    def transpose(self, pitch_factor):
+    def get(self, offset, default=None):
+        self._realize()
+        return dict.get(self, offset, default)
+
+    def keys(self):
+        self._realize()
+        return dict.keys(self)
+
+    def values(self):
+        self._realize()
+        return dict.values(self)
+
+    def items(self):
+        self._realize()
+        return dict.items(self)
+
+    def copy(self):
         result = Piece()
-        for offset, tones in self.items():
-            new_tones = []
-            for tone in tones:
-                new_tones.append(tone.transpose(pitch_factor))
-            result[offset] = new_tones
+        dict.update(result, self.items())
         return result
 
+    def setdefault(self, offset, default=None):
+        self._realize()
+        return dict.setdefault(self, offset, default)
+
+    def pop(self, *args):
+        self._realize()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._realize()
+        return dict.popitem(self)
+
+    def update(self, *args, **kwargs):
+        self._realize()
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self._realize()
+        dict.clear(self)
+
+    def stretch(self, duration_factor):
+        return self._transform(duration_factor, 1, Vector())
+
+    def transpose(self, pitch_factor):
+        """
+        Transpose by given pitch factor, which is factorized once for the whole
+        piece instead of once per tone.
+        """
+        try:
+            pitch_vector = Vector.from_frequency(pitch_factor)
+        except ValueError:
+            pitch_vector = None
+        return self._transform(1, pitch_factor, pitch_vector)
+
     @property
     def duration(self):
+        source = self._source
+        if source is not None:
+            return source.duration * self._time_scale
         return max(offset + tone.duration for offset, tones in self.items()
                    for tone in tones)
 
+    def events(self):
+        """
+        Yield (offset, tone) pairs of all tones in the piece.
+        Repetitions are expanded on the fly, so they never need to be materialized.
+        """
+        for offset, tones in self.items():
+            for tone in tones:
+                if isinstance(tone, Repeat):
+                    for sub_offset, sub_tone in tone.events():
+                        yield offset + sub_offset, sub_tone
+                else:
+                    yield offset, tone
+
+    def sorted_events(self):
+        """
+        Yield (offset, tone) pairs of all tones in the piece in order of offset.
+        Repetitions are expanded on the fly and merged with the other tones.
+        """
+        # Flattening before sorting visits the tones in the order they were created,
+        # which is much faster than visiting them in sorted order
+        events = [(offset, tone) for offset, tones in self.items() for tone in tones]
+        events.sort(key=itemgetter(0))
+        # Check for repetitions without a python loop over all tones
+        if Repeat not in map(type, chain.from_iterable(self.values())):
+            return iter(events)
+
+        repetitions = [_shift(offset, tone.sorted_events()) for offset, tone in events
+                       if isinstance(tone, Repeat)]
+        plain_events = ((offset, tone) for offset, tone in events
+                        if not isinstance(tone, Repeat))
+        return heapq.merge(plain_events, *repetitions, key=itemgetter(0))
+
     def concat(self, other):
         """Return a piece where other is concatenated after self"""
-        if isinstance(other, Tone):
+        if isinstance(other, (Tone, Repeat)):
             other = Piece({0: [other]})
         if not isinstance(other, Piece):
             raise ValueError
@@ -262,3 +460,65 @@ class Piece(dict, Music):
             for tone in tones:
                 result[self.duration + offset].append(deepcopy(tone))
         return result
+
+
+def _shift(offset, events):
+    for sub_offset, tone in events:
+        yield offset + sub_offset, tone
+
+
+class Repeat(Music):
+
+    """
+    Symbolic repetition of a piece.
+    Only a reference to the body and the number of repetitions is stored, so a
+    repetition can be placed in a piece like a tone, and is only expanded when its
+    events are iterated.
+    """
+
+    def __init__(self, body, count):
+        if count < 0:
+            raise ValueError('Repetition count {} is negative.'.format(count))
+        if not isinstance(body, Piece):
+            body = Piece({0: [body]})
+        self.body = body
+        self.count = count
+
+    def __repr__(self):
+        return 'Repeat({}, {})'.format(self.body, self.count)
+
+    def stretch(self, duration_factor):
+        return Repeat(self.body.stretch(duration_factor), self.count)
+
+    def transpose(self, pitch_factor):
+        return Repeat(self.body.transpose(pitch_factor), self.count)
+
+    def concat(self, other):
+        result = Piece()
+        result[0] = [self]
+        return result.concat(other)
+
+    @property
+    def duration(self):
+        return self.body.duration * self.count
+
+    def events(self):
+        """Yield (offset, tone) pairs of all repetitions of the body."""
+        if self.count == 0:
+            return
+        body_duration = self.body.duration
+        for i in range(self.count):
+            for offset, tone in self.body.events():
+                yield i * body_duration + offset, tone
+
+    def sorted_events(self):
+        """Yield (offset, tone) pairs of all repetitions of the body in order of offset."""
+        if self.count == 0:
+            return
+        body_duration = self.body.duration
+        # The body is sorted once, so repetitions only need to be shifted
+        body_events = list(self.body.sorted_events())
+        for i in range(self.count):
+            shift = i * body_duration
+            for offset, tone in body_events:
+                yield shift + offset, tone
@@ -1,13 +1,29 @@
-from to_music21 import piece_to_music21
+import asyncio
+import gzip
+import io
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from subprocess import DEVNULL, PIPE
+from music21.lily import lilyObjects
+from music21.lily.translate import LilypondConverter
+from music21_converter import piece_to_stream
 
 
-def export_midi(piece, outputfile=None, beautify=False):
-    m21_result = piece_to_music21(piece)
+def piece_to_music21(piece, beautify=False):
+    m21_result = piece_to_stream(piece)
 
     if beautify:
         m21_result = m21_result.chordify()
         m21_result = m21_result.makeNotation()
 
+    return m21_result
+
+
+def export_midi(piece, outputfile=None, beautify=False):
+    m21_result = piece_to_music21(piece, beautify)
+
     if not outputfile:
         m21_result.write('midi')
     else:
@@ -15,11 +31,7 @@ def export_midi(piece, outputfile=None, beautify=False):
 
 
 def export_pdf(piece, outputfile=None, beautify=False):
-    m21_result = piece_to_music21(piece)
-
-    if beautify:
-        m21_result = m21_result.chordify()
-        m21_result = m21_result.makeNotation()
+    m21_result = piece_to_music21(piece, beautify)
 
     if not outputfile:
         m21_result.write('lily.pdf')
@@ -27,24 +39,197 @@ def export_pdf(piece, outputfile=None, beautify=False):
         m21_result.write('lily.pdf', outputfile)
 
 
-def export_csound(piece, outputfile=None):
-    """Export a piece to a csound score."""
-    outputfile = outputfile or 'output.sco'
+LILYPOND_VERSION = '2.18'
+
+
+class _LilypondWriter(LilypondConverter):
 
-    with open(outputfile, 'w') as f:
-        f.write(
-            '''
+    """
+    Lilypond converter that only writes lilypond files.
+    Music21 runs its configured lilypond executable to find out which version to
+    declare, so a fixed version is declared instead.
+    """
+
+    def setupTools(self):
+        self.versionString = (self.topLevelObject.backslash + 'version '
+                              + self.topLevelObject.quoteString(LILYPOND_VERSION))
+        self.versionScheme = lilyObjects.LyEmbeddedScm(self.versionString)
+        self.headerScheme = lilyObjects.LyEmbeddedScm('')
+
+
+def export_lilypond(piece, outputfile, beautify=False):
+    """
+    Export a piece to a lilypond file, without rendering it.
+    Unlike export_pdf, this does not need lilypond to be installed.
+    """
+    converter = _LilypondWriter()
+    converter.loadFromMusic21Object(piece_to_music21(piece, beautify))
+    converter.writeLyFile(fp=outputfile)
+
+
+CSOUND_HEADER = '''
 f1  0   4096    10 1 ; use GEN10 to compute a sine wave
 
 ;ins strt dur  amp(p4)   freq(p5)
 '''
-        )
 
-        for offset, tones in piece.items():
-            for tone in tones:
-                f.write('i1  {offset}  {duration}  4000   {pitch}\n'
-                        .format(offset=offset,
-                                duration=tone.duration,
-                                pitch=tone.frequency()))
+CSOUND_FOOTER = 'e ; indicates the end of the score'
+
+_MAX_CACHED_TAILS = 2 ** 16
+
+
+def export_csound(piece, outputfile=None, segment_size=None, compress=False,
+                  buffer_size=2 ** 20, batch_size=2 ** 12):
+    """
+    Export a piece to a csound score, with events sorted by offset.
+
+    Events are formatted in batches and written through a large buffer.
+    If segment_size is given, the events are split over segment files of at most
+    that many events, which are included by the main score in order.
+    If compress is true, the score is written gzipped, with a .gz extension.
+    Csound can not include gzipped files, so segments can not be compressed.
+    """
+    if segment_size and compress:
+        raise ValueError('Segmented scores can not be compressed, '
+                         'since csound can not include gzipped files.')
+
+    outputfile = outputfile or 'output.sco'
+    events = piece.sorted_events()
+    tails = {}
+
+    with _open_score(outputfile, compress, buffer_size) as f:
+        f.write(CSOUND_HEADER)
+        if not segment_size:
+            _write_csound_events(f, events, batch_size, tails)
+        else:
+            base, extension = os.path.splitext(outputfile)
+            segment_number = 0
+            for first_event in events:
+                segment_file = '{}.{:04d}{}'.format(base, segment_number, extension)
+                segment_events = chain([first_event], islice(events, segment_size - 1))
+                with _open_score(segment_file, compress, buffer_size) as segment:
+                    _write_csound_events(segment, segment_events, batch_size, tails)
+                f.write('#include "{}"\n'.format(os.path.basename(segment_file)))
+                segment_number += 1
+        f.write(CSOUND_FOOTER)
+
+
+def _open_score(filename, compress, buffer_size):
+    if compress:
+        return io.TextIOWrapper(io.BufferedWriter(gzip.open(filename + '.gz', 'wb'),
+                                                  buffer_size))
+    return open(filename, 'w', buffering=buffer_size)
+
+
+def _write_csound_events(f, events, batch_size, tails):
+    """
+    Write events in batches of score lines.
+    Durations and frequencies tend to repeat, so the ends of the lines are cached
+    in tails. Types are part of the key, since for example 1 and 1.0 are formatted
+    differently.
+    """
+    while True:
+        lines = []
+        for offset, tone in islice(events, batch_size):
+            duration = tone.duration
+            frequency = tone.frequency()
+            key = (duration, frequency, type(duration), type(frequency))
+            tail = tails.get(key)
+            if tail is None:
+                tail = tails[key] = '  %s  4000   %s\n' % (duration, frequency)
+            lines.append('i1  %s%s' % (offset, tail))
+        if not lines:
+            return
+        f.write(''.join(lines))
+        if len(tails) > _MAX_CACHED_TAILS:
+            tails.clear()
+
+
+EXPORT_FORMATS = ('midi', 'pdf', 'csound', 'audio')
+
+
+def export_all(piece, outputs, **kwargs):
+    """
+    Export a piece to several formats concurrently.
+    See export_concurrently for the arguments.
+    """
+    return asyncio.run(export_concurrently(piece, outputs, **kwargs))
+
+
+async def export_concurrently(piece, outputs, beautify=False, timeout=None, max_processes=2,
+                              max_workers=None, lilypond='lilypond', csound='csound',
+                              orchestra='csound/intro.orc'):
+    """
+    Export a piece to several formats concurrently.
+
+    Outputs maps formats from EXPORT_FORMATS to output filenames.
+    Like export_pdf, the pdf filename is given without extension.
+    The pure python writers are CPU bound, so they run in a pool of at most
+    max_workers processes, to which the piece is pickled. Lilypond and csound run
+    as subprocesses, of which at most max_processes run at the same time.
+    A subprocess that takes longer than timeout seconds is killed.
+    """
+    for export_format in outputs:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError('{} is not a valid export format'.format(export_format))
+
+    loop = asyncio.get_running_loop()
+    process_slots = asyncio.Semaphore(max_processes)
+
+    with ProcessPoolExecutor(max_workers) as executor:
+
+        def write(exporter, *args):
+            return loop.run_in_executor(executor, exporter, piece, *args)
+
+        async def render(*command):
+            async with process_slots:
+                await run_process(command, timeout)
+
+        async def export_pdf_async(outputfile):
+            lilypond_file = outputfile + '.ly'
+            await write(export_lilypond, lilypond_file, beautify)
+            await render(lilypond, '--pdf', '-o', outputfile, lilypond_file)
+
+        async def export_audio_async(outputfile, score_file, score):
+            await score
+            await render(csound, orchestra, score_file, '-o', outputfile)
+
+        tasks = []
+        if 'midi' in outputs:
+            tasks.append(write(export_midi, outputs['midi'], beautify))
+        if 'pdf' in outputs:
+            tasks.append(export_pdf_async(outputs['pdf']))
+        if 'csound' in outputs or 'audio' in outputs:
+            # Rendering audio reuses the csound score, if one is requested
+            score_file = outputs.get('csound') or os.path.splitext(outputs['audio'])[0] + '.sco'
+            score = write(export_csound, score_file)
+            tasks.append(score)
+            if 'audio' in outputs:
+                tasks.append(export_audio_async(outputs['audio'], score_file, score))
+
+        # Let all exports finish before reporting the first failure
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+
+async def run_process(command, timeout=None):
+    """
+    Run an external tool, killing it if it takes longer than timeout seconds.
+    The tool runs in a session of its own, so that processes it starts itself, like
+    ghostscript started by lilypond, are killed as well.
+    """
+    process = await asyncio.create_subprocess_exec(*command, stdout=DEVNULL, stderr=PIPE,
+                                                   start_new_session=True)
+    try:
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
+        raise RuntimeError('{} did not finish within {} seconds'.format(command[0], timeout))
 
-        f.write('e ; indicates the end of the score')
+    if process.returncode != 0:
+        raise RuntimeError('{} failed with exit code {}: {}'.format(
+            command[0], process.returncode, stderr.decode(errors='replace').strip()
+        ))
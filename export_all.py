@@ -0,0 +1,39 @@
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('inputfile', help='Filename of .ma file to be exported')
+parser.add_argument('--midi', help='Filename of output midi file')
+parser.add_argument('--pdf', help='Filename of output pdf file, without extension')
+parser.add_argument('--csound', help='Filename of output csound score')
+parser.add_argument('--audio', help='Filename of audio file rendered by csound')
+parser.add_argument('--orchestra', help='Csound orchestra to render audio with',
+                    default='csound/intro.orc')
+parser.add_argument('--timeout', help='Seconds after which external tools are killed',
+                    type=float)
+parser.add_argument('--jobs', help='Maximum number of external tools running at once',
+                    type=int, default=2)
+parser.add_argument('--beautify', help='If specified, convert result to proper notation',
+                    action='store_true')
+
+# Exports run in worker processes, which may import this script again
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    from arithmeticparser import parse_file
+    from arithmetic import to_composition
+    from optimizer import optimize
+    from export import export_all, EXPORT_FORMATS
+
+    outputs = {export_format: getattr(args, export_format) for export_format in EXPORT_FORMATS
+               if getattr(args, export_format)}
+    if not outputs:
+        parser.error('specify at least one of {}'.format(
+            ', '.join('--' + export_format for export_format in EXPORT_FORMATS)
+        ))
+
+    print('Exporting {}'.format(args.inputfile))
+
+    arith_expr, _ = optimize(parse_file(args.inputfile))
+    piece = to_composition(arith_expr)
+    export_all(piece, outputs, beautify=args.beautify, timeout=args.timeout,
+               max_processes=args.jobs, orchestra=args.orchestra)
@@ -9,11 +9,12 @@ args = parser.parse_args()
 
 from arithmeticparser import parse_file
 from arithmetic import to_composition
+from optimizer import optimize
 from export import export_pdf
 
 print('Exporting {}'.format(args.inputfile))
 
-arith_expr = parse_file(args.inputfile)
+arith_expr, _ = optimize(parse_file(args.inputfile))
 piece = to_composition(arith_expr)
 export_pdf(piece, args.outputfile, args.beautify)
 
@@ -8,9 +8,11 @@ def piece_to_stream(piece):
         raise ValueError
 
     s = stream.Stream()
-    for offset, tones in piece.items():
-        for tone in tones:
-            s.insert(offset, tone_to_note(tone))
+    for offset, tone in piece.events():
+        s.insert(offset, tone_to_note(tone))
+    # Stream.flat was replaced by Stream.flatten in later versions of music21
+    if hasattr(s, 'flatten'):
+        return s.flatten()
     return s.flat
 
 
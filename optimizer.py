@@ -0,0 +1,257 @@
+"""
+This module contains an optimization pass over music arithmetic expressions.
+The optimized expression evaluates to the same composition, but has fewer nodes.
+Merging transpositions may keep tones in vector form where the original
+expression would have fallen back to raw frequencies, because the merged pitch
+factor is computed exactly.
+"""
+from fractions import Fraction
+from arithmetic import (PitchLiteral, BinaryOperation, Multiplication, Division, Duration,
+                        Repetition, Serial, Parallel, to_composition)
+from composition import Vector
+
+
+class OptimizationStats:
+
+    """Statistics about the rewrites performed by the optimizer."""
+
+    def __init__(self):
+        self.nodes_before = 0
+        self.nodes_after = 0
+        self.folded_constants = 0
+        self.merged_durations = 0
+        self.merged_transpositions = 0
+        self.pushed_transpositions = 0
+        self.factored_transpositions = 0
+        self.flattened_operations = 0
+        self.removed_identities = 0
+
+    @property
+    def nodes_eliminated(self):
+        return self.nodes_before - self.nodes_after
+
+    def __repr__(self):
+        return ('OptimizationStats({} nodes eliminated: {} -> {})'
+                .format(self.nodes_eliminated, self.nodes_before, self.nodes_after))
+
+
+def optimize(arith_expr):
+    """
+    Return a simplified expression with the same semantics as the given one,
+    together with statistics on the simplification.
+    """
+    stats = OptimizationStats()
+    stats.nodes_before = count_nodes(arith_expr)
+    result = _optimize(arith_expr, stats)
+    stats.nodes_after = count_nodes(result)
+    return result, stats
+
+
+def count_nodes(arith_expr):
+    """Return the number of nodes in the given expression tree."""
+    if isinstance(arith_expr, BinaryOperation):
+        return 1 + sum(count_nodes(operand) for operand in arith_expr.operands)
+    return 1
+
+
+def _optimize(arith_expr, stats):
+    if not isinstance(arith_expr, BinaryOperation):
+        return arith_expr
+
+    operands = [_optimize(operand, stats) for operand in arith_expr.operands]
+
+    if type(arith_expr) in (Serial, Parallel):
+        return _flatten(type(arith_expr), operands, stats)
+
+    elif type(arith_expr) == Duration:
+        return _optimize_duration(operands[0], operands[1], stats)
+
+    elif type(arith_expr) == Multiplication:
+        return _optimize_multiplication(operands[0], operands[1], stats)
+
+    elif type(arith_expr) == Division:
+        return _optimize_division(operands[0], operands[1], stats)
+
+    return type(arith_expr)(*operands)
+
+
+def _is_number(arith_expr):
+    """Check whether given expression is a nonzero numeric literal."""
+    if type(arith_expr) != PitchLiteral:
+        return False
+    try:
+        # Zero is excluded, because it can't be factorized nor divided by
+        return Fraction(arith_expr.token) != 0
+    except ValueError:
+        return False
+
+
+def _is_factor(arith_expr):
+    """Check whether given expression is a valid duration factor."""
+    if type(arith_expr) != PitchLiteral:
+        return False
+    try:
+        float(arith_expr.token)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_constant(arith_expr):
+    """Check whether given expression is a folded numeric tone."""
+    if type(arith_expr) == Duration:
+        return _is_number(arith_expr.left) and _is_factor(arith_expr.right)
+    return _is_number(arith_expr)
+
+
+def _is_identity(arith_expr):
+    """Check whether multiplying by given expression does nothing."""
+    return _is_number(arith_expr) and Fraction(arith_expr.token) == 1
+
+
+def _fold(arith_expr):
+    """
+    Evaluate given expression of constants and return it as a literal,
+    with a duration if necessary.
+    """
+    tone = to_composition(arith_expr)
+    if isinstance(tone, Vector):
+        x, y, z = tone
+        value = Fraction(2) ** x * Fraction(3) ** y * Fraction(5) ** z
+        literal = PitchLiteral(str(value))
+    else:
+        literal = PitchLiteral(repr(float(tone.frequency())))
+
+    if tone.duration != 1:
+        return Duration(literal, PitchLiteral(repr(float(tone.duration))))
+    return literal
+
+
+def _flatten(operation, operands, stats):
+    """
+    Turn nested associative operations of the same type into a single one,
+    and move a multiplication shared by all operands up, out of the operation.
+    """
+    flat_operands = []
+    for operand in operands:
+        if type(operand) == operation:
+            flat_operands.extend(operand.operands)
+            stats.flattened_operations += 1
+        else:
+            flat_operands.append(operand)
+
+    # Transposing and stretching commute with concatenating and stacking
+    if all(type(operand) == Multiplication and _is_constant(operand.left)
+           for operand in flat_operands) \
+            and len({repr(operand.left) for operand in flat_operands}) == 1:
+        stats.factored_transpositions += 1
+        multiplier = flat_operands[0].left
+        subject = _flatten(operation, [operand.right for operand in flat_operands], stats)
+        return _scale(multiplier, subject, stats)
+
+    return operation(*flat_operands)
+
+
+def _optimize_duration(subject, factor, stats):
+    if not _is_factor(factor) or _is_number(subject):
+        return Duration(subject, factor)
+
+    if type(subject) == Duration and _is_factor(subject.right):
+        stats.merged_durations += 1
+        value = float(subject.right.token) * float(factor.token)
+        subject = subject.left
+        factor = PitchLiteral(repr(value))
+
+    if float(factor.token) == 1:
+        stats.removed_identities += 1
+        return subject
+    return Duration(subject, factor)
+
+
+def _optimize_multiplication(multiplier, subject, stats):
+    if not _is_constant(multiplier):
+        return Multiplication(multiplier, subject)
+
+    if _is_constant(subject):
+        stats.folded_constants += 1
+        return _fold(Multiplication(multiplier, subject))
+
+    return _scale(multiplier, subject, stats)
+
+
+def _optimize_division(subject, divisor, stats):
+    if not _is_constant(divisor):
+        return Division(subject, divisor)
+
+    if _is_constant(subject):
+        stats.folded_constants += 1
+        return _fold(Division(subject, divisor))
+
+    if type(subject) == Multiplication and _is_constant(subject.left):
+        stats.merged_transpositions += 1
+        return _scale(_fold(Division(subject.left, divisor)), subject.right, stats)
+
+    if type(subject) == Division and _is_constant(subject.right):
+        stats.merged_transpositions += 1
+        return Division(subject.left, _fold(Multiplication(subject.right, divisor)))
+
+    # Dividing is multiplying by the reciprocal, which may be pushed to the leaves
+    result = Division(subject, divisor)
+    pushed = _push(_fold(Division(PitchLiteral('1'), divisor)), subject)
+    if count_nodes(pushed) < count_nodes(result):
+        stats.pushed_transpositions += 1
+        return pushed
+    return result
+
+
+def _scale(multiplier, subject, stats):
+    """
+    Return the optimized multiplication of subject by the constant multiplier.
+    The multiplication is either kept at the top of subject, merged with
+    multiplications directly below it, or pushed down to the leaves of subject,
+    whichever results in the fewest nodes.
+    """
+    if type(subject) == Multiplication and _is_constant(subject.left):
+        stats.merged_transpositions += 1
+        multiplier = _fold(Multiplication(multiplier, subject.left))
+        subject = subject.right
+
+    elif type(subject) == Division and _is_constant(subject.right):
+        stats.merged_transpositions += 1
+        multiplier = _fold(Division(multiplier, subject.right))
+        subject = subject.left
+
+    if _is_identity(multiplier):
+        stats.removed_identities += 1
+        return subject
+
+    result = Multiplication(multiplier, subject)
+    pushed = _push(multiplier, subject)
+    if count_nodes(pushed) < count_nodes(result):
+        stats.pushed_transpositions += 1
+        return pushed
+    return result
+
+
+def _push(multiplier, subject):
+    """
+    Return the multiplication of subject by the constant multiplier, pushed down
+    as far as possible.
+    """
+    if _is_constant(subject):
+        return _fold(Multiplication(multiplier, subject))
+
+    if type(subject) in (Serial, Parallel):
+        return type(subject)(*(_push(multiplier, operand) for operand in subject.operands))
+
+    if type(subject) in (Duration, Repetition):
+        # Stretching and repeating commute with transposition
+        return type(subject)(_push(multiplier, subject.left), subject.right)
+
+    if type(subject) == Multiplication and _is_constant(subject.left):
+        return Multiplication(_fold(Multiplication(multiplier, subject.left)), subject.right)
+
+    if type(subject) == Division and _is_constant(subject.right):
+        return Multiplication(_fold(Division(multiplier, subject.right)), subject.left)
+
+    return Multiplication(multiplier, subject)
@@ -0,0 +1,27 @@
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('inputfile', help='Filename of .ma file to be played')
+parser.add_argument('--protocol', help='Protocol to send tones with', choices=['osc', 'midi'],
+                    default='osc')
+parser.add_argument('--host', help='Host to send tones to', default='127.0.0.1')
+parser.add_argument('--port', help='UDP port to send tones to', type=int)
+parser.add_argument('--tempo', help='Beats per minute', type=float, default=60)
+args = parser.parse_args()
+
+from arithmeticparser import parse_file
+from arithmetic import to_composition
+from optimizer import optimize
+from playback import play, OscSink, MidiSink
+
+sink_class = OscSink if args.protocol == 'osc' else MidiSink
+sink = sink_class(args.host, args.port) if args.port else sink_class(args.host)
+
+print('Playing {}'.format(args.inputfile))
+
+arith_expr, _ = optimize(parse_file(args.inputfile))
+piece = to_composition(arith_expr)
+try:
+    print(play(piece, sink, tempo=args.tempo))
+finally:
+    sink.close()
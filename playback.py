@@ -0,0 +1,249 @@
+"""
+This module contains a real-time playback engine for compositions.
+Events of a piece are streamed in time order to a sink, such as a synthesizer
+listening for OSC or MIDI over UDP.
+"""
+import asyncio
+import heapq
+import math
+import socket
+import struct
+import time
+from abc import abstractmethod
+from collections import deque, namedtuple
+from itertools import chain, islice
+from composition import Rest
+
+# Kind is either 'on' or 'off', voice identifies the tone for the matching 'off'
+Message = namedtuple('Message', ['time', 'kind', 'voice', 'tone'])
+
+
+class Sink:
+
+    """
+    Abstract output for playback messages.
+    Messages are prepared ahead of time, so that sending them is as cheap as possible.
+    """
+
+    def prepare(self, message):
+        """Return the payload to send for given message, or None to skip it."""
+        return message
+
+    @abstractmethod
+    def send(self, payload):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySink(Sink):
+
+    """Sink that records payloads with the time they were sent, for testing."""
+
+    def __init__(self):
+        self.received = []
+
+    def send(self, payload):
+        self.received.append((time.monotonic(), payload))
+
+
+class UdpSink(Sink):
+
+    """Abstract sink that sends payloads as UDP datagrams."""
+
+    def __init__(self, host='127.0.0.1', port=57120):
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, payload):
+        self.socket.sendto(payload, self.address)
+
+    def close(self):
+        self.socket.close()
+
+
+class OscSink(UdpSink):
+
+    """
+    Sink that sends OSC messages with exact frequencies.
+    A tone is started by '/note_on voice frequency' and stopped by '/note_off voice'.
+    """
+
+    def prepare(self, message):
+        if message.kind == 'on':
+            return osc_message('/note_on', message.voice, float(message.tone.frequency()))
+        return osc_message('/note_off', message.voice)
+
+
+class MidiSink(UdpSink):
+
+    """
+    Sink that sends raw MIDI bytes.
+    Exact frequencies are approximated by the nearest note and a pitch bend.
+    Since pitch bend applies to a whole channel, each sounding tone gets a channel
+    of its own, so that it can be bent independently. If more tones sound at once
+    than there are channels, the tone that has been sounding longest is stopped
+    and its channel is reused.
+    """
+
+    def __init__(self, host='127.0.0.1', port=5004, channels=None, bend_range=2,
+                 velocity=100):
+        UdpSink.__init__(self, host, port)
+        # Channel 10 is reserved for percussion
+        self.channels = list(channels or (c for c in range(16) if c != 9))
+        self.bend_range = bend_range
+        self.velocity = velocity
+        # Channels are reused in the order they were released, to let tones die out
+        self._free_channels = deque(self.channels)
+        # Maps voices to their channel and note, in the order the tones started
+        self._sounding = {}
+
+    def prepare(self, message):
+        if message.kind == 'off':
+            if message.voice not in self._sounding:
+                # The tone was already stopped to free its channel
+                return None
+            channel, note = self._sounding.pop(message.voice)
+            self._free_channels.append(channel)
+            return bytes([0x80 | channel, note, 0])
+
+        stolen = b''
+        if not self._free_channels:
+            oldest_voice = next(iter(self._sounding))
+            channel, note = self._sounding.pop(oldest_voice)
+            self._free_channels.append(channel)
+            stolen = bytes([0x80 | channel, note, 0])
+        channel = self._free_channels.popleft()
+
+        pitch = 69 + 12 * math.log2(message.tone.frequency() / 440)
+        note = min(127, max(0, round(pitch)))
+        bend = round(8192 + (pitch - note) / self.bend_range * 8192)
+        bend = min(16383, max(0, bend))
+
+        self._sounding[message.voice] = (channel, note)
+        return stolen + bytes([0xE0 | channel, bend & 0x7F, bend >> 7,
+                               0x90 | channel, note, self.velocity])
+
+
+def osc_message(address, *arguments):
+    """
+    Encode an OSC message with int and float arguments.
+    Floats are sent as 64 bit doubles, so that exact frequencies are not rounded
+    to the 7 significant digits of a 32 bit float.
+    """
+    type_tags = ',' + ''.join('i' if isinstance(a, int) else 'd' for a in arguments)
+    data = [_osc_string(address), _osc_string(type_tags)]
+    for argument in arguments:
+        data.append(struct.pack('>i' if isinstance(argument, int) else '>d', argument))
+    return b''.join(data)
+
+
+def _osc_string(string):
+    """Encode a null terminated string, padded to a multiple of four bytes."""
+    data = string.encode('ascii') + b'\0'
+    return data + b'\0' * (-len(data) % 4)
+
+
+class PlaybackStats:
+
+    """Statistics about the timing accuracy of a playback."""
+
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.events = 0
+        self.late_events = 0
+        self.max_lateness = 0
+        self.mean_lateness = 0
+        self._squared_deviations = 0
+
+    def add(self, lateness):
+        """Register an event that was sent lateness seconds after it was due."""
+        # Welford's algorithm, so that no lateness values need to be stored
+        self.events += 1
+        if lateness > self.tolerance:
+            self.late_events += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        deviation = lateness - self.mean_lateness
+        self.mean_lateness += deviation / self.events
+        self._squared_deviations += deviation * (lateness - self.mean_lateness)
+
+    @property
+    def jitter(self):
+        """Standard deviation of the lateness."""
+        if self.events < 2:
+            return 0
+        return math.sqrt(self._squared_deviations / (self.events - 1))
+
+    def __repr__(self):
+        return ('PlaybackStats({} events, {} late, mean lateness {:.6f}s, '
+                'max lateness {:.6f}s, jitter {:.6f}s)'
+                .format(self.events, self.late_events, self.mean_lateness,
+                        self.max_lateness, self.jitter))
+
+
+def messages(piece):
+    """Yield the note on and note off messages of a piece in time order."""
+    note_offs = []
+    for voice, (offset, tone) in enumerate(piece.sorted_events()):
+        while note_offs and note_offs[0][0] <= offset:
+            yield Message(*heapq.heappop(note_offs))
+        if isinstance(tone, Rest):
+            continue
+        yield Message(offset, 'on', voice, tone)
+        heapq.heappush(note_offs, (offset + tone.duration, 'off', voice, tone))
+    while note_offs:
+        yield Message(*heapq.heappop(note_offs))
+
+
+def play(piece, sink, **kwargs):
+    """
+    Play a piece on a sink and return the playback statistics.
+    See play_async for the arguments.
+    """
+    return asyncio.run(play_async(piece, sink, **kwargs))
+
+
+async def play_async(piece, sink, tempo=60, latency=0.05, lookahead=0.1, spin=0.002,
+                     tolerance=0.001):
+    """
+    Play a piece on a sink, with tempo in beats per minute.
+
+    Playback starts latency seconds from now. Messages due within lookahead
+    seconds are prepared in advance. The scheduler sleeps until spin seconds
+    before a message is due and busy-waits for the rest, since sleeping is not
+    precise. Messages sent more than tolerance seconds late count as late.
+    """
+    loop = asyncio.get_running_loop()
+    seconds_per_beat = 60 / tempo
+    pending = messages(piece)
+    # The first message is pulled before starting the clock, since getting it sorts
+    # all events of the piece, which may take longer than the latency
+    pending = chain(list(islice(pending, 1)), pending)
+    buffer = deque()
+    stats = PlaybackStats(tolerance)
+    start = loop.time() + latency
+
+    while True:
+        horizon = loop.time() + lookahead
+        while pending is not None and (not buffer or buffer[-1][0] <= horizon):
+            try:
+                message = next(pending)
+            except StopIteration:
+                pending = None
+                break
+            payload = sink.prepare(message)
+            if payload is not None:
+                buffer.append((start + message.time * seconds_per_beat, payload))
+
+        if not buffer:
+            return stats
+
+        due, payload = buffer.popleft()
+        # Yield to the event loop even when behind schedule, so playback can be cancelled
+        delay = due - loop.time() - spin
+        await asyncio.sleep(max(delay, 0))
+        while loop.time() < due:
+            pass
+        sink.send(payload)
+        stats.add(loop.time() - due)
@@ -0,0 +1,27 @@
+from arithmeticparser import parse_string
+from arithmetic import to_composition
+from composition import Piece
+
+
+def events(string):
+    """Return the events of given expression in a comparable form."""
+    piece = to_composition(parse_string(string))
+    return sorted((offset, tone.frequency(), tone.duration) for offset, tone in piece.events())
+
+
+def test_repetition_equals_expansion():
+    assert events('(c e | 2) ^ 3') == events('c e | 2 c e | 2 c e | 2')
+
+
+def test_repetition_equals_expansion_in_parallel():
+    assert events('(c e) ^ 4, g') == events('(c e c e c e c e), g')
+    assert events('g, (c e) ^ 4') == events('g, (c e c e c e c e)')
+    assert events('(c e) ^ 2 g, (d f) ^ 2') == events('c e c e g, d f d f')
+
+
+def test_parallel_keeps_simultaneous_tones():
+    assert len(events('c, e, g')) == 3
+
+
+def test_top_level_repetition_is_piece():
+    assert isinstance(to_composition(parse_string('(c e g) ^ 3')), Piece)
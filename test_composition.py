@@ -0,0 +1,44 @@
+import pickle
+from operator import itemgetter
+import pytest
+from composition import Piece, Rest, Symbol, Vector
+
+
+def deferred_piece():
+    return Piece({0: [Vector(1)], 1: [Vector(0, 1)]}).stretch(2).transpose(3)
+
+
+def test_deferred_piece_equals_realized():
+    expected = Piece({0: [Vector(1, 1, duration=2)], 2: [Vector(0, 2, duration=2)]})
+    assert deferred_piece() == expected
+    assert deferred_piece() != Piece()
+
+
+def test_deferred_piece_mutation():
+    piece = deferred_piece()
+    assert piece.pop(0, None) is not None
+    del piece[2]
+    assert len(piece) == 0
+
+    piece = deferred_piece()
+    piece.setdefault(10, [])
+    piece.update({20: []})
+    assert sorted(piece) == [0, 2, 10, 20]
+
+    piece = deferred_piece()
+    piece.popitem()
+    piece.clear()
+    assert len(piece) == 0
+
+
+def test_deferred_piece_copy():
+    assert sorted(deferred_piece().copy()) == [0, 2]
+    assert isinstance(deferred_piece().copy(), Piece)
+    assert pickle.loads(pickle.dumps(deferred_piece())) == deferred_piece()
+
+
+def test_transpose_by_zero():
+    with pytest.raises(ValueError):
+        Vector.from_frequency(0)
+    piece = Piece({0: [Symbol('c')], 1: [Rest()], 2: [Vector(1)]}).transpose(0)
+    assert [tone.frequency() for _, tone in sorted(piece.events(), key=itemgetter(0))] == [0, 0, 0]
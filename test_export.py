@@ -0,0 +1,110 @@
+import gzip
+import os
+import time
+import pytest
+from arithmeticparser import parse_string
+from arithmetic import to_composition
+from export import export_all, export_csound
+
+
+def piece():
+    return to_composition(parse_string('(c e, g | 2) ^ 2 d'))
+
+
+def stub(directory, name, script):
+    """Write an executable shell script to use instead of an external tool."""
+    path = os.path.join(str(directory), name)
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n' + script + '\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def test_export_all(tmp_path):
+    # Csound is called as: csound orchestra score -o output
+    csound = stub(tmp_path, 'csound', 'cp "$2" "$4"')
+    outputs = {export_format: str(tmp_path / name) for export_format, name in
+               [('midi', 'out.mid'), ('pdf', 'out'), ('csound', 'out.sco'),
+                ('audio', 'out.wav')]}
+    export_all(piece(), outputs, lilypond='true', csound=csound)
+
+    assert os.path.getsize(outputs['midi']) > 0
+    assert os.path.getsize(outputs['pdf'] + '.ly') > 0
+    with open(outputs['csound']) as score, open(outputs['audio']) as audio:
+        assert audio.read() == score.read()
+
+
+def test_audio_without_score(tmp_path):
+    csound = stub(tmp_path, 'csound', 'cp "$2" "$4"')
+    export_all(piece(), {'audio': str(tmp_path / 'out.wav')}, csound=csound)
+    with open(str(tmp_path / 'out.sco')) as score, open(str(tmp_path / 'out.wav')) as audio:
+        assert audio.read() == score.read()
+
+
+def test_failing_tool(tmp_path):
+    with pytest.raises(RuntimeError, match='exit code 1'):
+        export_all(piece(), {'audio': str(tmp_path / 'out.wav')}, csound='false')
+
+
+def test_timeout_kills_child_processes(tmp_path):
+    # Like lilypond running ghostscript, the tool starts a process of its own
+    csound = stub(tmp_path, 'csound', 'sleep 5')
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match='did not finish'):
+        export_all(piece(), {'audio': str(tmp_path / 'out.wav')}, csound=csound,
+                   timeout=0.5)
+    assert time.monotonic() - start < 3
+
+
+def test_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        export_all(piece(), {'mp3': str(tmp_path / 'out.mp3')})
+
+
+def score_lines(filename):
+    with open(filename) as f:
+        return [line for line in f.read().splitlines() if line.startswith('i1')]
+
+
+def test_export_csound_sorted(tmp_path):
+    repeated = to_composition(parse_string('((c e, g | 3) ^ 3, d ^ 5) a'))
+    written_out = to_composition(parse_string(
+        '((c e, g | 3) (c e, g | 3) (c e, g | 3), d d d d d) a'
+    ))
+    export_csound(repeated, str(tmp_path / 'repeated.sco'))
+    export_csound(written_out, str(tmp_path / 'written_out.sco'))
+
+    # Offsets may be formatted as 3 or 3.0, depending on how they were computed
+    events = [tuple(map(float, line.split()[1:])) for line in
+              score_lines(str(tmp_path / 'repeated.sco'))]
+    assert len(events) == 15
+    assert [event[0] for event in events] == sorted(event[0] for event in events)
+    assert sorted(events) == sorted(tuple(map(float, line.split()[1:])) for line in
+                                    score_lines(str(tmp_path / 'written_out.sco')))
+
+
+def test_export_csound_segments(tmp_path):
+    export_csound(piece(), str(tmp_path / 'whole.sco'))
+    export_csound(piece(), str(tmp_path / 'score.sco'), segment_size=4)
+
+    with open(str(tmp_path / 'score.sco')) as f:
+        includes = [line for line in f.read().splitlines() if line.startswith('#include')]
+    assert includes == ['#include "score.0000.sco"', '#include "score.0001.sco"']
+    segment_lines = (score_lines(str(tmp_path / 'score.0000.sco'))
+                     + score_lines(str(tmp_path / 'score.0001.sco')))
+    assert len(score_lines(str(tmp_path / 'score.0000.sco'))) == 4
+    assert segment_lines == score_lines(str(tmp_path / 'whole.sco'))
+
+
+def test_export_csound_compressed(tmp_path):
+    export_csound(piece(), str(tmp_path / 'plain.sco'))
+    export_csound(piece(), str(tmp_path / 'compressed.sco'), compress=True)
+    assert not os.path.exists(str(tmp_path / 'compressed.sco'))
+    with gzip.open(str(tmp_path / 'compressed.sco.gz'), 'rt') as compressed, \
+            open(str(tmp_path / 'plain.sco')) as plain:
+        assert compressed.read() == plain.read()
+
+
+def test_export_csound_compressed_segments(tmp_path):
+    with pytest.raises(ValueError):
+        export_csound(piece(), str(tmp_path / 'score.sco'), segment_size=4, compress=True)
@@ -0,0 +1,81 @@
+import math
+import pytest
+from arithmeticparser import parse_string
+from arithmetic import to_composition
+from composition import Piece
+from optimizer import optimize, count_nodes
+
+EXPRESSIONS = [
+    '2 * 3 * c',
+    '2 * (3 * (c e))',
+    '(c e g) / 2 / 3',
+    '(2 * (c e)) / 4',
+    '(3 5) / 2',
+    '(c | 2) | 1.5',
+    '(c e) | 1',
+    '(3 | 2) * (c e)',
+    '(c e) / (2 | 0.5)',
+    '2 * (c e) ^ 3',
+    '(3 * c 5 * e) ^ 2 | 2',
+    '((c | 0.5) ^ 4, g ^ 2) / 3',
+    '1 * (c e)',
+    '(2 * (c e)) (2 * (g c)) (2 * (d f))',
+    '2 * c, 2 * (e g) | 2',
+    '(3 5 15) (2 3) ^ 2',
+    '_ 2 * _ c',
+    '(2 * c) (e * g)',
+    '(e * g) (2 * c)',
+    '(2 * c), (e * g)',
+]
+
+
+def events(arith_expr):
+    """Return the events of given expression, sorted on offset and frequency."""
+    # Concatenate with empty piece to ensure the result is a piece
+    piece = to_composition(arith_expr).concat(Piece())
+    return sorted((float(offset), float(tone.frequency()), float(tone.duration))
+                  for offset, tone in piece.events())
+
+
+@pytest.mark.parametrize('string', EXPRESSIONS)
+def test_optimize_keeps_events(string):
+    arith_expr = parse_string(string)
+    optimized, stats = optimize(arith_expr)
+    expected = events(arith_expr)
+    actual = events(optimized)
+    assert len(actual) == len(expected)
+    for (offset, frequency, duration), (exp_offset, exp_frequency, exp_duration) \
+            in zip(actual, expected):
+        assert math.isclose(offset, exp_offset)
+        assert math.isclose(frequency, exp_frequency)
+        assert math.isclose(duration, exp_duration)
+    assert stats.nodes_after <= stats.nodes_before
+
+
+def test_stats_counts():
+    arith_expr = parse_string('2 * 3 * c')
+    optimized, stats = optimize(arith_expr)
+    assert repr(optimized) == '6 * c'
+    assert stats.folded_constants == 1
+    assert stats.nodes_before == count_nodes(arith_expr) == 5
+    assert stats.nodes_after == count_nodes(optimized) == 3
+    assert stats.nodes_eliminated == 2
+
+    _, stats = optimize(parse_string('(c | 2) | 1.5'))
+    assert stats.merged_durations == 1
+    assert stats.nodes_eliminated == 2
+
+    _, stats = optimize(parse_string('1 * (c e)'))
+    assert stats.removed_identities == 1
+
+    optimized, stats = optimize(parse_string('(3 5) / 2'))
+    assert repr(optimized) == '3/2 5/2'
+    assert stats.pushed_transpositions == 1
+
+
+def test_shared_multiplier_is_factored():
+    optimized, stats = optimize(parse_string('(2 * (c e)) (2 * (g c)) (2 * (d f))'))
+    assert repr(optimized) == '2 * (c e g c d f)'
+    assert stats.factored_transpositions == 2
+    assert stats.flattened_operations > 0
+    assert stats.nodes_after == 9
@@ -0,0 +1,64 @@
+import math
+import struct
+from arithmeticparser import parse_string
+from arithmetic import to_composition
+from playback import MemorySink, MidiSink, PlaybackStats, messages, osc_message, play
+
+
+def play_string(string):
+    sink = MemorySink()
+    stats = play(to_composition(parse_string(string)), sink, tempo=6000, latency=0.01)
+    return [payload for _, payload in sink.received], stats
+
+
+def test_note_off_before_simultaneous_note_on():
+    received, _ = play_string('c d')
+    assert [(m.time, m.kind, m.voice) for m in received] == [
+        (0, 'on', 0), (1, 'off', 0), (1, 'on', 1), (2, 'off', 1)
+    ]
+
+
+def test_rests_are_skipped():
+    received, _ = play_string('c _ | 2 d')
+    assert [(m.time, m.kind) for m in received] == [
+        (0, 'on'), (1, 'off'), (3, 'on'), (4, 'off')
+    ]
+
+
+def test_playback_stats():
+    received, stats = play_string('(c e, g) ^ 3')
+    assert stats.events == len(received) == 18
+    assert stats.late_events <= stats.events
+    assert stats.max_lateness >= stats.mean_lateness
+
+    stats = PlaybackStats(tolerance=0.001)
+    for lateness in [0, 0.002, 0.004]:
+        stats.add(lateness)
+    assert stats.events == 3
+    assert stats.late_events == 2
+    assert math.isclose(stats.max_lateness, 0.004)
+    assert math.isclose(stats.mean_lateness, 0.002)
+    assert math.isclose(stats.jitter, 0.002)
+
+
+def test_osc_frequency_is_double():
+    frequency = 261.6255653005986
+    data = osc_message('/note_on', 0, frequency)
+    assert data[12:16] == b',id\0'
+    assert struct.unpack('>d', data[-8:])[0] == frequency
+
+
+def test_midi_channels_are_not_shared():
+    sink = MidiSink(channels=[0, 1])
+    try:
+        piece = to_composition(parse_string('c | 2, e, g | 3'))
+        payloads = [sink.prepare(message) for message in messages(piece)]
+    finally:
+        sink.close()
+    # The third tone stops the first one to take its channel
+    assert payloads[2][:3] == bytes([0x80, 60, 0])
+    assert payloads[2][3] == 0xE0 and payloads[2][6] == 0x90
+    # The note off of the stopped tone is skipped
+    assert None in payloads
+    channels = [payload[0] & 0x0F for payload in payloads[:2]]
+    assert channels == [0, 1]